@@ -16,10 +16,32 @@ from PIL import Image, ImageTk
 import sqlite3
 import os
 import datetime
+import math
+import threading
+import sys
+import time
+import argparse
+import pathlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 DB_NAME = "Mundo_peças.db"
 LOGO_PATH = "logo.png"  # colocar logo da mecânica aqui (ou deixar placeholder)
 
+# Previsão de reposição de peças (job em segundo plano)
+FORECAST_WINDOW_DAYS = 90          # janela de consumo usada na taxa diária
+REORDER_LEAD_DAYS = 7              # prazo médio de entrega do fornecedor
+REORDER_SAFETY_DAYS = 3            # estoque de segurança, em dias de consumo
+REORDER_COVER_DAYS = 30            # o pedido sugerido cobre este período
+FORECAST_INTERVAL_MS = 15 * 60 * 1000
+
+# Manutenção do banco (python main.py manutencao ...)
+BACKUP_DIR = "backups"
+BACKUP_PAGES_PER_STEP = 256        # páginas copiadas por passo do backup online
+BACKUP_STEP_SLEEP = 0.05           # pausa entre passos (libera o banco para gravações)
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_KEEP = 7                  # snapshots mantidos; os mais antigos são apagados
+
 # ---------- Banco de Dados ----------
 def init_db():
     conn = sqlite3.connect(DB_NAME)
@@ -77,6 +99,72 @@ def init_db():
             FOREIGN KEY(service_id) REFERENCES services(id)
         )
     ''')
+    # Veículos: placa gravada já normalizada (ver normalize_plate), com índice único
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS vehicles(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_id INTEGER,
+            plate TEXT,
+            model TEXT,
+            year INTEGER,
+            color TEXT,
+            FOREIGN KEY(client_id) REFERENCES users(id)
+        )
+    ''')
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_vehicles_plate ON vehicles(plate)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_vehicles_client ON vehicles(client_id)")
+    # Ordens de serviço ligadas ao veículo (bancos antigos ainda não têm a coluna)
+    service_cols = [r[1] for r in c.execute("PRAGMA table_info(services)")]
+    if service_cols and "vehicle_id" not in service_cols:
+        c.execute("ALTER TABLE services ADD COLUMN vehicle_id INTEGER REFERENCES vehicles(id)")
+    if service_cols:
+        # índice de cobertura: o histórico por veículo é lido só do índice, já ordenado por data
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_services_vehicle_history
+            ON services(vehicle_id, date, description, price, status)
+        ''')
+        # relatórios por mês (inclusive o consolidado das filiais) somam direto do índice
+        c.execute("CREATE INDEX IF NOT EXISTS idx_services_date ON services(date, price)")
+    if c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='invoices'").fetchone():
+        c.execute("CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices(date, total, paid)")
+
+    # Consumo de peças por ordem de serviço (base do histórico de consumo)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS service_parts(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service_id INTEGER,
+            part_id INTEGER,
+            qty INTEGER,
+            date TEXT,
+            FOREIGN KEY(service_id) REFERENCES services(id),
+            FOREIGN KEY(part_id) REFERENCES parts(id)
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_service_parts_part_date ON service_parts(part_id, date, qty)")
+    # Sugestões de reposição gravadas pelo job run_reorder_forecast (lidas pelo Dashboard)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS part_forecasts(
+            part_id INTEGER PRIMARY KEY,
+            qty INTEGER,
+            daily_rate REAL,
+            reorder_point INTEGER,
+            reorder_qty INTEGER,
+            days_left REAL,
+            alert INTEGER,
+            updated_at TEXT,
+            FOREIGN KEY(part_id) REFERENCES parts(id)
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_part_forecasts_alert ON part_forecasts(alert, days_left)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_part_forecasts_stale ON part_forecasts(updated_at) WHERE daily_rate > 0")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS forecast_state(
+            id INTEGER PRIMARY KEY,
+            last_usage_id INTEGER,
+            last_part_id INTEGER,
+            updated_at TEXT
+        )
+    ''')
 
     # Inserir dados de exemplo mínimos (6 cadastros)
     try:
@@ -128,6 +216,335 @@ def init_db():
 def format_currency(v):
     return f"R$ {v:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
+def normalize_plate(plate):
+    # "abc-1d23" / "ABC 1D23" -> "ABC1D23" (mesma chave do índice único)
+    return "".join(ch for ch in plate.upper() if ch.isalnum())
+
+# ---------- Previsão de reposição ----------
+def run_reorder_forecast(db_path=None):
+    # Job incremental: recalcula só as peças com consumo novo, as peças novas e as previsões
+    # de dias anteriores (janela de consumo andou). Usa conexão própria para rodar em thread.
+    conn = sqlite3.connect(db_path or DB_NAME, timeout=30)
+    try:
+        c = conn.cursor()
+        c.execute("SELECT last_usage_id, last_part_id FROM forecast_state WHERE id=1")
+        row = c.fetchone()
+        last_usage_id, last_part_id = row if row else (0, 0)
+        c.execute("SELECT COALESCE(MAX(id), 0) FROM service_parts")
+        max_usage_id = c.fetchone()[0]
+        c.execute("SELECT COALESCE(MAX(id), 0) FROM parts")
+        max_part_id = c.fetchone()[0]
+
+        today = datetime.date.today()
+        since = (today - datetime.timedelta(days=FORECAST_WINDOW_DAYS)).isoformat()
+        part_ids = set()
+        c.execute("SELECT DISTINCT part_id FROM service_parts WHERE id > ? AND id <= ?",
+                  (last_usage_id, max_usage_id))
+        part_ids.update(r[0] for r in c.fetchall())
+        c.execute("SELECT id FROM parts WHERE id > ? AND id <= ?", (last_part_id, max_part_id))
+        part_ids.update(r[0] for r in c.fetchall())
+        # previsões de dias anteriores (a janela andou): todas na primeira rodada do dia
+        c.execute("SELECT part_id FROM part_forecasts WHERE daily_rate > 0 AND updated_at < ?",
+                  (today.isoformat(),))
+        part_ids.update(r[0] for r in c.fetchall())
+
+        for part_id in part_ids:
+            c.execute("SELECT qty FROM parts WHERE id=?", (part_id,))
+            prow = c.fetchone()
+            if not prow:
+                c.execute("DELETE FROM part_forecasts WHERE part_id=?", (part_id,))
+                continue
+            qty = prow[0] or 0
+            c.execute("SELECT COALESCE(SUM(qty), 0) FROM service_parts WHERE part_id=? AND date >= ?",
+                      (part_id, since))
+            used = c.fetchone()[0]
+            # divide pelos dias de histórico que a peça realmente tem (peça nova ou logo após
+            # a implantação tem menos que a janela; dividir por 90 subestimaria o consumo)
+            c.execute("SELECT MIN(date) FROM service_parts WHERE part_id=?", (part_id,))
+            first_use = c.fetchone()[0]
+            days = FORECAST_WINDOW_DAYS
+            if first_use:
+                days = min(FORECAST_WINDOW_DAYS, (today - datetime.date.fromisoformat(first_use)).days + 1)
+            rate = used / max(days, 1)
+            reorder_point = math.ceil(rate * (REORDER_LEAD_DAYS + REORDER_SAFETY_DAYS))
+            target = math.ceil(rate * (REORDER_LEAD_DAYS + REORDER_SAFETY_DAYS + REORDER_COVER_DAYS))
+            reorder_qty = max(target - qty, 0)
+            days_left = qty / rate if rate else None
+            alert = 1 if rate and qty <= reorder_point else 0
+            c.execute('''
+                INSERT OR REPLACE INTO part_forecasts(part_id,qty,daily_rate,reorder_point,reorder_qty,days_left,alert,updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (part_id, qty, rate, reorder_point, reorder_qty, days_left, alert, today.isoformat()))
+
+        c.execute("INSERT OR REPLACE INTO forecast_state(id,last_usage_id,last_part_id,updated_at) VALUES (1, ?, ?, ?)",
+                  (max_usage_id, max_part_id, datetime.datetime.now().isoformat(timespec="seconds")))
+        conn.commit()
+        return len(part_ids)
+    finally:
+        conn.close()
+
+# ---------- Manutenção (backup, snapshot, otimização, integridade) ----------
+def format_size(n):
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+def timestamped_path(directory, prefix):
+    # <prefix><data_hora>.db; backup/VACUUM INTO não podem reaproveitar um arquivo do mesmo segundo
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(directory, f"{prefix}{stamp}.db")
+    n = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{prefix}{stamp}_{n:02d}.db")
+        n += 1
+    return path
+
+def backup_db(dest, db_path=None):
+    # backup online em passos de BACKUP_PAGES_PER_STEP páginas; entre um passo e outro
+    # o banco fica livre para gravações do app (nada de cópia "rasgada" do arquivo)
+    start = time.perf_counter()
+    steps = []
+    existed = os.path.exists(dest)
+    src = sqlite3.connect(db_path or DB_NAME, timeout=30)
+    try:
+        dst = sqlite3.connect(dest)
+        try:
+            src.backup(dst, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP,
+                       progress=lambda status, remaining, total: steps.append(remaining))
+        finally:
+            dst.close()
+    except sqlite3.Error:
+        # não deixa para trás uma cópia incompleta criada por esta rodada
+        if not existed and os.path.exists(dest):
+            os.remove(dest)
+        raise
+    finally:
+        src.close()
+    return {"path": dest, "size": os.path.getsize(dest), "steps": len(steps),
+            "duration": time.perf_counter() - start}
+
+def snapshot_db(directory=SNAPSHOT_DIR, keep=SNAPSHOT_KEEP, db_path=None):
+    # VACUUM INTO gera uma cópia compactada e consistente; mantém só os `keep` mais recentes
+    # deste banco (o prefixo com o nome do banco separa bancos que dividem a mesma pasta)
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.splitext(os.path.basename(db_path or DB_NAME))[0] + "_snapshot_"
+    path = timestamped_path(directory, prefix)
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path or DB_NAME, timeout=30)
+    try:
+        conn.execute("VACUUM INTO ?", (path,))
+    finally:
+        conn.close()
+    duration = time.perf_counter() - start
+    snaps = sorted(f for f in os.listdir(directory) if f.startswith(prefix) and f.endswith(".db"))
+    removed = snaps[:-keep] if keep > 0 else []
+    for f in removed:
+        os.remove(os.path.join(directory, f))
+    return {"path": path, "size": os.path.getsize(path), "removed": removed, "duration": duration}
+
+def optimize_db(db_path=None):
+    # atualiza estatísticas do planejador de consultas (analysis_limit evita varrer tabelas grandes)
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path or DB_NAME, timeout=30)
+    try:
+        conn.execute("PRAGMA analysis_limit=1000")
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+        conn.commit()
+    finally:
+        conn.close()
+    return {"duration": time.perf_counter() - start}
+
+def check_db(quick=False, db_path=None):
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path or DB_NAME, timeout=30)
+    busy = False
+    try:
+        rows = [r[0] for r in conn.execute("PRAGMA quick_check" if quick else "PRAGMA integrity_check")]
+    except sqlite3.OperationalError as e:
+        # banco ocupado/travado ("database is locked"): a verificação não rodou, não é dano
+        rows, busy = [str(e)], True
+    except sqlite3.DatabaseError as e:
+        # dano grave: o próprio PRAGMA falha ("database disk image is malformed")
+        rows = [str(e)]
+    finally:
+        conn.close()
+    return {"ok": rows == ["ok"], "busy": busy, "messages": rows, "duration": time.perf_counter() - start}
+
+def run_maintenance(argv):
+    parser = argparse.ArgumentParser(prog="main.py manutencao",
+                                     description="Manutenção do banco: backup online, snapshot, otimização e integridade. "
+                                                 "Sem opções, executa todas as etapas.")
+    parser.add_argument("--db", default=DB_NAME, help=f"arquivo do banco (padrão: {DB_NAME})")
+    parser.add_argument("--check", action="store_true", help="PRAGMA integrity_check")
+    parser.add_argument("--quick", action="store_true", help="usa PRAGMA quick_check (mais rápido)")
+    parser.add_argument("--backup", nargs="?", const="", metavar="DESTINO",
+                        help=f"backup online (padrão: pasta {BACKUP_DIR}/)")
+    parser.add_argument("--snapshot", action="store_true", help="VACUUM INTO com retenção")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR)
+    parser.add_argument("--keep", type=int, default=SNAPSHOT_KEEP, help="snapshots mantidos")
+    parser.add_argument("--optimize", action="store_true", help="ANALYZE + PRAGMA optimize")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.db):
+        parser.error(f"banco não encontrado: {args.db}")
+    run_all = not (args.check or args.backup is not None or args.snapshot or args.optimize)
+    print(f"Banco: {args.db} ({format_size(os.path.getsize(args.db))})")
+
+    if run_all or args.check:
+        r = check_db(quick=args.quick, db_path=args.db)
+        if r["busy"]:
+            print(f"[integridade] NÃO VERIFICADO: {r['messages'][0]} — tente fora do horário de uso.")
+            return 1
+        print(f"[integridade] {'ok' if r['ok'] else 'FALHOU'} em {r['duration']:.2f} s")
+        if not r["ok"]:
+            for msg in r["messages"]:
+                print(f"  {msg}")
+            # não copia um banco danificado nem apaga snapshots bons pela retenção
+            print("Banco com erro de integridade: backup, snapshot e otimização não executados.")
+            return 1
+    if run_all or args.backup is not None:
+        dest = args.backup
+        if not dest:
+            os.makedirs(BACKUP_DIR, exist_ok=True)
+            base = os.path.splitext(os.path.basename(args.db))[0]
+            dest = timestamped_path(BACKUP_DIR, f"{base}_")
+        try:
+            r = backup_db(dest, db_path=args.db)
+        except sqlite3.Error as e:
+            print(f"[backup] FALHOU: {e}")
+            return 1
+        print(f"[backup] {r['path']} — {format_size(r['size'])} em {r['duration']:.2f} s ({r['steps']} passos)")
+    if run_all or args.snapshot:
+        r = snapshot_db(args.snapshot_dir, args.keep, db_path=args.db)
+        print(f"[snapshot] {r['path']} — {format_size(r['size'])} em {r['duration']:.2f} s")
+        for f in r["removed"]:
+            print(f"  removido (retenção): {f}")
+    if run_all or args.optimize:
+        r = optimize_db(db_path=args.db)
+        print(f"[otimização] ANALYZE + PRAGMA optimize em {r['duration']:.2f} s")
+    return 0
+
+# ---------- Relatório consolidado (várias filiais) ----------
+def month_range(month):
+    # "2026-09" -> ("2026-09-01", "2026-10-01"), intervalo que usa os índices por data
+    start = datetime.datetime.strptime(month, "%Y-%m").date()
+    end = (start + datetime.timedelta(days=32)).replace(day=1)
+    return start.isoformat(), end.isoformat()
+
+def shop_labels(db_paths):
+    # nome de cada filial no relatório: nome do arquivo; se repetir (todas usam DB_NAME),
+    # pasta/arquivo; se ainda repetir, o caminho completo
+    def candidates(path):
+        full = os.path.abspath(path)
+        stem = os.path.splitext(os.path.basename(full))[0]
+        return [stem, f"{os.path.basename(os.path.dirname(full))}/{stem}", full]
+    for level in range(3):
+        labels = [candidates(p)[level] for p in db_paths]
+        if len(set(labels)) == len(labels):
+            break
+    return labels
+
+def shop_report(shop, db_path, month=None):
+    # roda num processo do pool: conexão própria, somente leitura, erros viram texto no relatório
+    start = time.perf_counter()
+    result = {"shop": shop, "error": None,
+              "services_cnt": 0, "services_sum": 0.0, "inv_cnt": 0, "inv_sum": 0.0, "paid_sum": 0.0}
+    where, params = "", ()
+    if month:
+        where, params = " WHERE date >= ? AND date < ?", month_range(month)
+    try:
+        conn = sqlite3.connect(pathlib.Path(db_path).absolute().as_uri() + "?mode=ro", uri=True, timeout=30)
+        try:
+            c = conn.cursor()
+            c.execute("SELECT COUNT(*), SUM(price) FROM services" + where, params)
+            result["services_cnt"], services_sum = c.fetchone()
+            result["services_sum"] = services_sum or 0.0
+            c.execute("SELECT COUNT(*), SUM(total), SUM(CASE WHEN paid THEN total ELSE 0 END) FROM invoices" + where,
+                      params)
+            result["inv_cnt"], inv_sum, paid_sum = c.fetchone()
+            result["inv_sum"] = inv_sum or 0.0
+            result["paid_sum"] = paid_sum or 0.0
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        result["error"] = str(e)
+    result["duration"] = time.perf_counter() - start
+    return result
+
+def consolidate_reports(shops, month=None):
+    # shops: [(nome, arquivo .db)]; uma filial por processo, o tempo total fica perto do da mais lenta
+    if month:
+        month_range(month)  # valida o formato antes de abrir o pool
+    start = time.perf_counter()
+    names = [name for name, _ in shops]
+    db_paths = [path for _, path in shops]
+    # spawn: o app tem threads (job de previsão) e fork com threads pode travar o processo filho
+    with ProcessPoolExecutor(max_workers=min(len(shops), os.cpu_count() or 1),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        shops = list(pool.map(shop_report, names, db_paths, [month] * len(shops)))
+    # totais só das filiais lidas com sucesso; as com erro são contadas à parte
+    ok_shops = [s for s in shops if not s["error"]]
+    total = {key: sum(s[key] for s in ok_shops) for key in ("services_cnt", "services_sum", "inv_cnt", "inv_sum", "paid_sum")}
+    return {"month": month, "shops": shops, "total": total, "failed": len(shops) - len(ok_shops),
+            "duration": time.perf_counter() - start}
+
+def format_consolidated_report(result):
+    lines = [
+        f"Relatório Consolidado - Auto Repair ({len(result['shops'])} filiais)",
+        f"Período: {result['month'] or 'todo o histórico'}",
+        f"Data de geração: {datetime.datetime.now().isoformat()}",
+        "",
+    ]
+    for s in result["shops"]:
+        if s["error"]:
+            lines.append(f"[{s['shop']}] ERRO: {s['error']}")
+            continue
+        lines.append(f"[{s['shop']}] serviços: {s['services_cnt']} ({format_currency(s['services_sum'])}) | "
+                     f"faturas: {s['inv_cnt']} ({format_currency(s['inv_sum'])}) | "
+                     f"pago: {format_currency(s['paid_sum'])} | {s['duration']:.2f} s")
+    t = result["total"]
+    slowest = max((s["duration"] for s in result["shops"]), default=0.0)
+    lines.append("")
+    if result["failed"]:
+        lines.append(f"TOTAIS PARCIAIS ({result['failed']} filiais com erro excluídas)")
+    lines += [
+        f"Total de serviços: {t['services_cnt']}",
+        f"Receita potencial (soma preços serviços): {format_currency(t['services_sum'])}",
+        f"Total de faturas: {t['inv_cnt']}",
+        f"Receita faturada: {format_currency(t['inv_sum'])}",
+        f"Receita paga: {format_currency(t['paid_sum'])}",
+        "",
+        f"Tempo total: {result['duration']:.2f} s (filial mais lenta: {slowest:.2f} s)",
+    ]
+    return "\n".join(lines)
+
+def run_consolidated(argv):
+    parser = argparse.ArgumentParser(prog="main.py consolidado",
+                                     description="Relatório de serviços e faturas somando os bancos de várias filiais.")
+    parser.add_argument("bancos", nargs="+", metavar="[NOME=]BANCO",
+                        help="arquivos .db das filiais, opcionalmente com nome (ex.: centro=loja1/Mundo_peças.db)")
+    parser.add_argument("--mes", help="mês no formato AAAA-MM (padrão: todo o histórico)")
+    args = parser.parse_args(argv)
+    names, db_paths = [], []
+    for arg in args.bancos:
+        name, sep, path = arg.partition("=")
+        if not sep or not name or not path or os.path.exists(arg):
+            name, path = None, arg
+        names.append(name)
+        db_paths.append(path)
+    auto = shop_labels(db_paths)
+    names = [name or label for name, label in zip(names, auto)]
+    if len(set(names)) != len(names):
+        parser.error("nomes de filiais repetidos; use NOME=BANCO para diferenciá-las")
+    try:
+        result = consolidate_reports(list(zip(names, db_paths)), args.mes)
+    except ValueError:
+        parser.error(f"mês inválido: {args.mes} (use AAAA-MM)")
+    print(format_consolidated_report(result))
+    return 1 if any(s["error"] for s in result["shops"]) else 0
+
 # ---------- App UI ----------
 class MundopeçasApp:
     def __init__(self, root):
@@ -138,10 +555,20 @@ class MundopeçasApp:
         self.conn = sqlite3.connect(DB_NAME)
         self.user = None  # usuário logado (dict)
         self.logo_img = None
+        self.forecast_thread = None  # rodada atual do job de previsão
 
         # Cria todas as telas (12) como métodos que constroem janelas Toplevel quando chamados.
         # Tela principal: Welcome -> Login
         self.build_welcome_screen()
+        self.schedule_forecast()
+
+    # --- job periódico de previsão de reposição (thread própria, não trava a interface) ---
+    def schedule_forecast(self):
+        # não sobrepõe rodadas: se a anterior ainda está gravando, espera o próximo intervalo
+        if self.forecast_thread is None or not self.forecast_thread.is_alive():
+            self.forecast_thread = threading.Thread(target=run_reorder_forecast, daemon=True)
+            self.forecast_thread.start()
+        self.root.after(FORECAST_INTERVAL_MS, self.schedule_forecast)
 
     # --- helpers para imagens (logo/placeholder) ---
     def load_logo(self, w=200, h=100):
@@ -299,22 +726,28 @@ class MundopeçasApp:
         ttk.Label(stats, text=f"Ferramentas cadastradas: {tools_n}", font=("Segoe UI", 10)).grid(row=0, column=1, padx=8)
         ttk.Label(stats, text=f"Usuários cadastrados: {users_n}", font=("Segoe UI", 10)).grid(row=0, column=2, padx=8)
 
-        # simple financial suggestion: if many parts stock low -> suggest reorder
-        c.execute("SELECT name, qty FROM parts ORDER BY qty ASC LIMIT 5")
+        # sugestões de reposição pré-calculadas pelo job run_reorder_forecast (não varre a tabela parts)
+        c.execute('''
+            SELECT p.name, p.qty, f.reorder_point, f.reorder_qty, f.days_left FROM part_forecasts f
+            JOIN parts p ON p.id = f.part_id
+            WHERE f.alert = 1
+            ORDER BY f.days_left ASC LIMIT 10
+        ''')
         low = c.fetchall()
         sugg_frame = ttk.LabelFrame(frame, text="Sugestões e Alertas")
         sugg_frame.pack(fill=tk.X, padx=6, pady=8)
         if low:
             lines = []
-            for name, qty in low:
-                if qty <= 5:
-                    lines.append(f"Repor peça '{name}' (estoque: {qty})")
-            if lines:
-                ttk.Label(sugg_frame, text="\n".join(lines)).pack(padx=6, pady=6)
-            else:
-                ttk.Label(sugg_frame, text="Estoque saudável no momento.").pack(padx=6, pady=6)
+            for name, qty, reorder_point, reorder_qty, days_left in low:
+                lines.append(f"Repor peça '{name}' (estoque: {qty}, ponto de pedido: {reorder_point}, "
+                             f"~{days_left:.0f} dias) — sugerido: {reorder_qty} un.")
+            ttk.Label(sugg_frame, text="\n".join(lines)).pack(padx=6, pady=6)
         else:
-            ttk.Label(sugg_frame, text="Sem peças cadastradas.").pack(padx=6, pady=6)
+            c.execute("SELECT updated_at FROM forecast_state WHERE id=1")
+            if c.fetchone():
+                ttk.Label(sugg_frame, text="Estoque saudável no momento.").pack(padx=6, pady=6)
+            else:
+                ttk.Label(sugg_frame, text="Previsão de reposição ainda não calculada.").pack(padx=6, pady=6)
 
         # Navigation grid to other windows (total windows = 12 across app)
         nav = ttk.Frame(frame)
@@ -331,6 +764,7 @@ class MundopeçasApp:
         ttk.Button(nav, text="10. Configurações", width=20, command=self.build_settings_screen).grid(row=3, column=0, padx=6, pady=4)
         ttk.Button(nav, text="11. Tela de Ajuda", width=20, command=self.build_help_screen).grid(row=3, column=1, padx=6, pady=4)
         ttk.Button(nav, text="12. Sair", width=20, command=self.logout).grid(row=3, column=2, padx=6, pady=4)
+        ttk.Button(nav, text="13. Veículos", width=20, command=self.build_vehicles_screen).grid(row=4, column=0, padx=6, pady=4)
 
     # 5) Tela de cadastro de peças
     def build_parts_screen(self):
@@ -505,10 +939,13 @@ class MundopeçasApp:
         desc_e = ttk.Entry(form, width=50); desc_e.grid(row=1,column=1)
         ttk.Label(form, text="Preço:").grid(row=2,column=0)
         price_e = ttk.Entry(form); price_e.grid(row=2,column=1)
+        ttk.Label(form, text="Placa (opcional):").grid(row=3,column=0)
+        plate_e = ttk.Entry(form); plate_e.grid(row=3,column=1)
 
         def add_service():
             cl_user = client_e.get().strip()
             desc = desc_e.get().strip()
+            plate = normalize_plate(plate_e.get())
             try:
                 price = float(price_e.get().replace(",","."))
             except:
@@ -521,15 +958,65 @@ class MundopeçasApp:
                 messagebox.showerror("Erro","Cliente não encontrado.")
                 return
             client_id = row[0]
+            vehicle_id = None
+            if plate:
+                c.execute("SELECT id, client_id FROM vehicles WHERE plate=?", (plate,))
+                row = c.fetchone()
+                if not row:
+                    messagebox.showerror("Erro","Veículo não encontrado. Cadastre a placa na tela de Veículos.")
+                    return
+                if row[1] != client_id:
+                    messagebox.showerror("Erro","Este veículo pertence a outro cliente.")
+                    return
+                vehicle_id = row[0]
             date = datetime.date.today().isoformat()
-            c.execute("INSERT INTO services(client_id,description,price,date,status) VALUES (?, ?, ?, ?, ?)",
-                      (client_id, desc, price, date, "Aberto"))
+            c.execute("INSERT INTO services(client_id,vehicle_id,description,price,date,status) VALUES (?, ?, ?, ?, ?, ?)",
+                      (client_id, vehicle_id, desc, price, date, "Aberto"))
             self.conn.commit()
             messagebox.showinfo("OK","Serviço cadastrado.")
             self.refresh_services_tree(tree)
 
-        ttk.Button(form, text="Adicionar Serviço", command=add_service).grid(row=3,column=0,columnspan=2,pady=6)
-        ttk.Button(form, text="Fechar", command=win.destroy).grid(row=4,column=0,columnspan=2,pady=4)
+        ttk.Button(form, text="Adicionar Serviço", command=add_service).grid(row=4,column=0,columnspan=2,pady=6)
+
+        # peças usadas na ordem: baixa no estoque + histórico de consumo (previsão de reposição)
+        parts_form = ttk.LabelFrame(win, text="Peças usadas"); parts_form.pack(pady=4)
+        ttk.Label(parts_form, text="Serviço ID:").grid(row=0,column=0)
+        sid_e = ttk.Entry(parts_form, width=8); sid_e.grid(row=0,column=1)
+        ttk.Label(parts_form, text="SKU:").grid(row=0,column=2)
+        sku_e = ttk.Entry(parts_form, width=14); sku_e.grid(row=0,column=3)
+        ttk.Label(parts_form, text="Qtd:").grid(row=0,column=4)
+        used_e = ttk.Entry(parts_form, width=6); used_e.grid(row=0,column=5)
+
+        def add_service_part():
+            try:
+                sid = int(sid_e.get())
+                used = int(used_e.get())
+                if used <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("Erro","Valores inválidos.")
+                return
+            c = self.conn.cursor()
+            c.execute("SELECT id FROM services WHERE id=?", (sid,))
+            if not c.fetchone():
+                messagebox.showerror("Erro","Serviço não encontrado.")
+                return
+            c.execute("SELECT id, qty FROM parts WHERE sku=?", (sku_e.get().strip(),))
+            row = c.fetchone()
+            if not row:
+                messagebox.showerror("Erro","Peça não encontrada.")
+                return
+            if (row[1] or 0) < used:
+                messagebox.showerror("Erro","Estoque insuficiente.")
+                return
+            c.execute("INSERT INTO service_parts(service_id,part_id,qty,date) VALUES (?, ?, ?, ?)",
+                      (sid, row[0], used, datetime.date.today().isoformat()))
+            c.execute("UPDATE parts SET qty = qty - ? WHERE id=?", (used, row[0]))
+            self.conn.commit()
+            messagebox.showinfo("OK","Peça registrada na ordem.")
+
+        ttk.Button(parts_form, text="Registrar Peça", command=add_service_part).grid(row=1,column=0,columnspan=6,pady=4)
+        ttk.Button(win, text="Fechar", command=win.destroy).pack(pady=4)
 
     def refresh_services_tree(self, tree):
         for r in tree.get_children():
@@ -595,7 +1082,7 @@ class MundopeçasApp:
     def build_reports_screen(self):
         win = tk.Toplevel(self.root)
         win.title("Relatórios - Auto Repair")
-        win.geometry("600x400")
+        win.geometry("600x460")
         frame = ttk.Frame(win, padding=10); frame.pack(fill=tk.BOTH, expand=True)
         ttk.Label(frame, text="Relatórios Rápidos", font=("Segoe UI", 12)).pack(pady=6)
         rpt = tk.Text(frame, height=18)
@@ -623,6 +1110,64 @@ Observações:
 - Conferir ferramentas emprestadas/indisponíveis.
 """
         rpt.insert("1.0", report_text)
+
+        # consolidado: este banco + bancos das outras filiais, um processo por filial
+        cons = ttk.Frame(frame); cons.pack(pady=4)
+        ttk.Label(cons, text="Mês (AAAA-MM, opcional):").grid(row=0,column=0)
+        month_e = ttk.Entry(cons, width=10); month_e.grid(row=0,column=1)
+
+        def consolidated_report():
+            paths = filedialog.askopenfilenames(title="Bancos das filiais",
+                                                filetypes=[("SQLite", "*.db"), ("Todos", "*.*")])
+            if not paths:
+                return
+            db_paths = [DB_NAME]
+            for p in paths:
+                if os.path.abspath(p) not in map(os.path.abspath, db_paths):
+                    db_paths.append(p)
+            month = month_e.get().strip() or None
+            try:
+                if month:
+                    month_range(month)
+            except ValueError:
+                messagebox.showerror("Erro", "Mês inválido (use AAAA-MM).")
+                return
+            shops = list(zip(shop_labels(db_paths), db_paths))
+
+            # roda fora da thread do Tk (a janela não congela); o resultado é lido por polling
+            # com win.after, pois widgets Tk só podem ser tocados pela thread principal
+            done = []
+            def worker():
+                try:
+                    done.append(consolidate_reports(shops, month))
+                except Exception as e:
+                    done.append(e)
+            thread = threading.Thread(target=worker, daemon=True)
+
+            def poll():
+                if not win.winfo_exists():
+                    return
+                if thread.is_alive():
+                    win.after(100, poll)
+                    return
+                win.config(cursor="")
+                cons_btn.state(["!disabled"])
+                result = done[0] if done else RuntimeError("consolidação interrompida")
+                if isinstance(result, Exception):
+                    messagebox.showerror("Erro", str(result))
+                    return
+                rpt.delete("1.0", tk.END)
+                rpt.insert("1.0", format_consolidated_report(result))
+
+            win.config(cursor="watch")
+            cons_btn.state(["disabled"])
+            rpt.delete("1.0", tk.END)
+            rpt.insert("1.0", f"Consolidando {len(shops)} filiais...")
+            thread.start()
+            win.after(100, poll)
+
+        cons_btn = ttk.Button(cons, text="Relatório Consolidado (filiais)", command=consolidated_report)
+        cons_btn.grid(row=0,column=2,padx=6)
         ttk.Button(frame, text="Fechar", command=win.destroy).pack(pady=6)
 
     # 11) Fluxograma (visual simplificado) - apenas uma tela com imagem/placeholder
@@ -668,12 +1213,114 @@ Observações:
             "9. Faturamento",
             "10. Relatórios",
             "11. Fluxograma",
-            "12. Wireframe / Protótipo"
+            "12. Wireframe / Protótipo",
+            "13. Veículos (busca por placa e histórico)"
         ]
         txt.insert("1.0", "Lista de Telas e Propósitos:\n\n" + "\n".join(entries))
         txt.pack(fill=tk.BOTH, expand=True)
         ttk.Button(f, text="Fechar", command=win.destroy).pack(pady=6)
 
+    # 13) Tela de Veículos (cadastro + busca por placa com histórico de serviços)
+    def build_vehicles_screen(self):
+        win = tk.Toplevel(self.root)
+        win.title("Veículos - Auto Repair")
+        win.geometry("800x560")
+        frame = ttk.Frame(win, padding=8); frame.pack(fill=tk.BOTH, expand=True)
+
+        search = ttk.Frame(frame); search.pack(fill=tk.X, pady=4)
+        ttk.Label(search, text="Placa:").pack(side=tk.LEFT, padx=4)
+        search_e = ttk.Entry(search); search_e.pack(side=tk.LEFT)
+        info_lbl = ttk.Label(frame, text="Informe a placa para ver o histórico do veículo.")
+        info_lbl.pack(anchor=tk.W, pady=4)
+
+        tree = ttk.Treeview(frame, columns=("date","description","price","status"), show="headings")
+        tree.heading("date", text="Data")
+        tree.heading("description", text="Descrição")
+        tree.heading("price", text="Preço")
+        tree.heading("status", text="Status")
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        def lookup_plate(event=None):
+            plate = normalize_plate(search_e.get())
+            vehicle = self.find_vehicle(plate) if plate else None
+            if not vehicle:
+                info_lbl.config(text="Veículo não encontrado.")
+                for r in tree.get_children():
+                    tree.delete(r)
+                return
+            vid, plate, model, year, owner = vehicle
+            info_lbl.config(text=f"{plate} • {model or '-'} ({year or '-'}) • Cliente: {owner or '-'}")
+            self.refresh_vehicle_history_tree(tree, vid)
+
+        search_e.bind("<Return>", lookup_plate)
+        ttk.Button(search, text="Buscar", command=lookup_plate).pack(side=tk.LEFT, padx=6)
+
+        form = ttk.Frame(win); form.pack(pady=6)
+        ttk.Label(form, text="Cliente (username):").grid(row=0,column=0)
+        client_e = ttk.Entry(form); client_e.grid(row=0,column=1)
+        ttk.Label(form, text="Placa:").grid(row=1,column=0)
+        plate_e = ttk.Entry(form); plate_e.grid(row=1,column=1)
+        ttk.Label(form, text="Modelo:").grid(row=2,column=0)
+        model_e = ttk.Entry(form, width=40); model_e.grid(row=2,column=1)
+        ttk.Label(form, text="Ano:").grid(row=3,column=0)
+        year_e = ttk.Entry(form); year_e.grid(row=3,column=1)
+
+        def add_vehicle():
+            cl_user = client_e.get().strip()
+            plate = normalize_plate(plate_e.get())
+            model = model_e.get().strip()
+            try:
+                year = int(year_e.get()) if year_e.get().strip() else None
+            except ValueError:
+                messagebox.showerror("Erro","Ano inválido.")
+                return
+            if not plate:
+                messagebox.showerror("Erro","Placa obrigatória.")
+                return
+            c = self.conn.cursor()
+            c.execute("SELECT id FROM users WHERE username=?", (cl_user,))
+            row = c.fetchone()
+            if not row:
+                messagebox.showerror("Erro","Cliente não encontrado.")
+                return
+            try:
+                c.execute("INSERT INTO vehicles(client_id,plate,model,year,color) VALUES (?, ?, ?, ?, ?)",
+                          (row[0], plate, model, year, ""))
+                self.conn.commit()
+            except sqlite3.IntegrityError:
+                messagebox.showerror("Erro","Placa já cadastrada.")
+                return
+            messagebox.showinfo("OK","Veículo cadastrado.")
+            search_e.delete(0, tk.END)
+            search_e.insert(0, plate)
+            lookup_plate()
+
+        ttk.Button(form, text="Cadastrar Veículo", command=add_vehicle).grid(row=4,column=0,columnspan=2,pady=6)
+        ttk.Button(form, text="Fechar", command=win.destroy).grid(row=5,column=0,columnspan=2,pady=4)
+
+    def find_vehicle(self, plate):
+        # busca pelo índice único da placa (plate já normalizada)
+        c = self.conn.cursor()
+        c.execute('''
+            SELECT v.id, v.plate, v.model, v.year, u.fullname FROM vehicles v
+            LEFT JOIN users u ON v.client_id = u.id
+            WHERE v.plate = ?
+        ''', (plate,))
+        return c.fetchone()
+
+    def refresh_vehicle_history_tree(self, tree, vehicle_id):
+        for r in tree.get_children():
+            tree.delete(r)
+        c = self.conn.cursor()
+        # lido inteiro do idx_services_vehicle_history, sem varrer a tabela services
+        c.execute('''
+            SELECT date, description, price, status FROM services
+            WHERE vehicle_id = ?
+            ORDER BY date DESC
+        ''', (vehicle_id,))
+        for row in c.fetchall():
+            tree.insert("", tk.END, values=(row[0], row[1], format_currency(row[2]), row[3]))
+
     # --- telas auxiliares: About, Settings, Help ---
     def build_about_screen(self):
         win = tk.Toplevel(self.root)
@@ -718,13 +1365,16 @@ Manual Rápido:
 - Faça login com usuário 'admin' / senha 'admin123' (admin de exemplo).
 - Registre clientes via tela 'Registrar Cliente'.
 - Cadastre peças e ferramentas no menu correspondente.
-- Registre serviços (ordens) indicando username do cliente.
+- Cadastre veículos (placa) e consulte o histórico na tela 'Veículos'.
+- Registre serviços (ordens) indicando username do cliente (e a placa, se houver).
+- Registre as peças usadas em cada ordem; o Dashboard sugere reposição pelo consumo.
 - Gere faturas para serviços.
 - Apenas administradores podem remover usuários.
 
 Dica:
 - Substitua 'logo.png' pelo logo da sua startup.
 - Exporte relatórios copiando o conteúdo da tela Relatórios.
+- Para somar as filiais, use 'Relatório Consolidado' e selecione os bancos das outras lojas.
 """
         ttk.Label(f, text=help_txt, justify=tk.LEFT).pack()
         ttk.Button(f, text="Fechar", command=win.destroy).pack(pady=6)
@@ -741,6 +1391,10 @@ Dica:
 
 # ---------- execução ----------
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "manutencao":
+        sys.exit(run_maintenance(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "consolidado":
+        sys.exit(run_consolidated(sys.argv[2:]))
     init_db()
     root = tk.Tk()
     app = MundopeçasApp(root)